@@ -2,9 +2,11 @@ from tracing import traceapi, routetrace
 from map import PathBuilder
 
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import Response
 from fastapi import FastAPI
 from io import BytesIO
+import threading
 import uvicorn
 
 api = FastAPI()
@@ -16,13 +18,19 @@ api.add_middleware(
     allow_headers=["*"],
 )
 
+# Raw ICMP sockets of all tracers in the process receive every reply and tracers share the pid based
+# identifier, so overlapping local traces would mix up their hops. They are run one at a time.
+_LOCAL_TRACE_LOCK = threading.Lock()
+
 
 @api.get("/trace/{trace_type}/{target_url}")
 async def trace(trace_type: str, target_url: str) -> Response:
+    # Tracing and map building block, run them in the threadpool to keep the event loop serving other requests.
+    # Local traces are still serialized by _LOCAL_TRACE_LOCK, external ones and map building run concurrently.
     if trace_type == "local":
-        return trace_from_local(target_url)
+        return await run_in_threadpool(trace_from_local, target_url)
     if trace_type == "external":
-        return trace_by_api(target_url)
+        return await run_in_threadpool(trace_by_api, target_url)
     return Response(f"Invalid trace_type: {trace_type}")
     
     
@@ -30,23 +38,23 @@ def _build_map(points: list[tuple[tuple[float, float], str]]) -> Response:
     html_out = BytesIO()
     PathBuilder(points, html_out)
 
-    html_out.seek(0)
-    map_data = html_out.read().decode()
-    return Response(map_data)
+    # Pass the rendered bytes as they are, decoding them would only be re-encoded by the Response.
+    return Response(html_out.getvalue(), media_type="text/html")
 
     
 def trace_from_local(target_url: str) -> Response:
-    try:
-        route_data = routetrace.RouteTracer(target_url).trace_route()
-    except:
-        return Response("Invalid address or failed to generate map.")
+    with _LOCAL_TRACE_LOCK:
+        try:
+            route_data = routetrace.RouteTracer(target_url).trace_route()
+        except:
+            return Response("Invalid address or failed to generate map.")
 
-    points = [
-        (
-            (point["lat"], point["lon"]), 
-            point["host"] or point["ip"]
-        ) for point in route_data if point["lat"]
-    ]
+        points = [
+            (
+                (point["lat"], point["lon"]), 
+                point["host"] or point["ip"]
+            ) for point in route_data if point["lat"]
+        ]
     
     return _build_map(points)
 
@@ -56,6 +64,8 @@ def trace_by_api(target_url: str) -> Response:
         return Response("Invalid address or failed to generate map.")
 
     points = traceapi.parse_response(data)
+    if not points:
+        return Response("Invalid address or failed to generate map.")
 
     return _build_map(points)
 
@@ -1,56 +1,312 @@
+from scipy.spatial import cKDTree
+import numpy as np
+import functools
+import hashlib
 import folium
+import tempfile
+import pickle
 import math
 import json
 import time
+import os
 
 
 GROUND_EXCHANGE_TYPE = "ground-exchange"
 SUBMARINE_TYPE = "submarine"
-CABLE_BREAK_LEN = 10
+CABLE_BREAK_LEN = 10  # Degrees of great-circle arc.
+
+
+GROUND_EXCHANGE_PATH = "data/ground-exchange.json"
+SUBMARINE_PATH = "data/submarine.json"
+INFRASTRUCTURE_CACHE_PATH = "data/_cache.pkl"
+INFRASTRUCTURE_CACHE_VERSION = 2  # Bump whenever the layout of loaded data changes.
+MAP_CACHE_DIR = "./cache/maps/"
+MAP_CACHE_MAX_SIZE = 64 * 1024 * 1024  # Bytes.
+MAP_CACHE_VERSION = 1  # Bump whenever routing or rendering of maps changes.
+
+
+def _load_infrastructure_cache() -> tuple[dict, list] | None:
+    """
+    Returns cached (INFRASTRUCTURE_POINTS, SUBMARINE_CABLES).
+    Cache is valid only if it was written after the latest change to the source data and by the current cache version.
+    """
+    try:
+        if os.path.getmtime(INFRASTRUCTURE_CACHE_PATH) < max(os.path.getmtime(GROUND_EXCHANGE_PATH), os.path.getmtime(SUBMARINE_PATH)):
+            return None
+
+        with open(INFRASTRUCTURE_CACHE_PATH, "rb") as cache_file:
+            cached_data = pickle.load(cache_file)
+    except Exception:  # Missing, truncated or corrupted cache, unpickling can fail with any of many exception types.
+        return None
+
+    if not isinstance(cached_data, tuple) or len(cached_data) != 3 or cached_data[0] != INFRASTRUCTURE_CACHE_VERSION:
+        return None
+    return cached_data[1:]
+
+
+def _atomic_write(path: str, data: bytes, **mkstemp_kwargs) -> bool:
+    """
+    Write cache file through a unique temporary file in the same directory, moved into place once complete,
+    so concurrent writers and readers never see a partial file. Caches are optional, so failure to write
+    (e.g. read-only directory) is ignored. Returns whether the file was written.
+    """
+    temp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), **mkstemp_kwargs)
+        with open(temp_fd, "wb") as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+    return True
+
+
+def _save_infrastructure_cache(infrastructure_points: dict, submarine_cables: list) -> None:
+    """ Pickle loaded registry, it loads several times faster than parsing the JSON sources on the next startup. """
+    cached_data = pickle.dumps((INFRASTRUCTURE_CACHE_VERSION, infrastructure_points, submarine_cables), protocol=pickle.HIGHEST_PROTOCOL)
+    _atomic_write(INFRASTRUCTURE_CACHE_PATH, cached_data, prefix="_cache.", suffix=".tmp")
+
+
+def _load_infrastructure() -> tuple[dict, list]:
+    """ Returns (INFRASTRUCTURE_POINTS, SUBMARINE_CABLES) from the cache, or parsed from the JSON sources and cached. """
+    cached_infrastructure = _load_infrastructure_cache()
+    if cached_infrastructure is not None:
+        return cached_infrastructure
+
+    infrastructure_points: dict[tuple[float, float], dict] = {}
+
+    with open(GROUND_EXCHANGE_PATH) as ground_exchange_file:
+        ground_ex_data = json.load(ground_exchange_file)
+        for ex_point_name, ex_point_loc in ground_ex_data.items():
+            infrastructure_points[tuple(ex_point_loc)] = {
+                "type": GROUND_EXCHANGE_TYPE,
+                "data": ex_point_name
+            }
+
+    with open(SUBMARINE_PATH) as submarine_file:
+        submarine_cables = json.load(submarine_file)
+        for cable in submarine_cables:
+            # Freeze endpoints once, lookups compare them against location tuples.
+            cable["endpoints"] = [tuple(cable_endpoint) for cable_endpoint in cable["endpoints"]]
+            cable["_endpoints_set"] = frozenset(cable["endpoints"])
+
+            if len(cable["endpoints"]) == 1:
+                continue
+
+            for cable_endpoint in cable["endpoints"]:
+                infrastructure_points[cable_endpoint] = {
+                    "type": SUBMARINE_TYPE,
+                    "data": cable
+                }
+
+    _save_infrastructure_cache(infrastructure_points, submarine_cables)
+    return infrastructure_points, submarine_cables
 
 
 # Load infrastructure data
-INFRASTRUCTURE_POINTS: dict[tuple[float, float], dict] = {}
-
-with open("data/ground-exchange.json") as ground_exchange_file:
-    ground_ex_data = json.load(ground_exchange_file)
-    for ex_point_name, ex_point_loc in ground_ex_data.items():
-        INFRASTRUCTURE_POINTS[tuple(ex_point_loc)] = {
-            "type": GROUND_EXCHANGE_TYPE,
-            "data": ex_point_name
-        }
-
-with open("data/submarine.json") as submarine_file:
-    SUBMARINE_CABLES = json.load(submarine_file)
-    for cable in SUBMARINE_CABLES:
-        if len(cable["endpoints"]) == 1:
+INFRASTRUCTURE_POINTS, SUBMARINE_CABLES = _load_infrastructure()
+
+# Versions of the loaded data and code, maps built by other versions are never reused.
+_MAP_CACHE_VERSIONS = (
+    MAP_CACHE_VERSION,
+    INFRASTRUCTURE_CACHE_VERSION,
+    os.path.getmtime(GROUND_EXCHANGE_PATH),
+    os.path.getmtime(SUBMARINE_PATH)
+)
+
+
+def _to_unit_xyz(locations) -> np.ndarray:
+    """
+    Convert (lat, lon) location(s) into points on the unit sphere.
+    Chord length between such points is ordered the same way as great-circle distance.
+    """
+    lat, lon = np.radians(np.asarray(locations, dtype=np.float64)).T
+    cos_lat = np.cos(lat)
+    return np.stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)), axis=-1)
+
+
+def _great_circle_dist(start_loc: tuple[float, float], end_loc: tuple[float, float]) -> float:
+    """ Returns great-circle distance between two (lat, lon) locations in degrees of arc. """
+    start_lat, start_lon = math.radians(start_loc[0]), math.radians(start_loc[1])
+    end_lat, end_lon = math.radians(end_loc[0]), math.radians(end_loc[1])
+
+    h = math.sin((end_lat - start_lat) / 2) ** 2 + math.cos(start_lat) * math.cos(end_lat) * math.sin((end_lon - start_lon) / 2) ** 2
+    return math.degrees(2 * math.asin(math.sqrt(min(h, 1.0))))
+
+
+def _great_circle_midpoint(start_loc: tuple[float, float], end_loc: tuple[float, float]) -> tuple[float, float]:
+    """ Returns (lat, lon) location halfway along the great circle between two locations. """
+    x, y, z = _to_unit_xyz(start_loc) + _to_unit_xyz(end_loc)
+    return (math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x)))
+
+
+def _great_circle_dists(points_xyz: np.ndarray, target_loc: tuple[float, float]) -> np.ndarray:
+    """ Returns great-circle distances in degrees of arc from every unit sphere point to the target location. """
+    offsets = points_xyz - _to_unit_xyz(target_loc)
+    chords = np.sqrt(np.einsum("ij,ij->i", offsets, offsets))
+    return np.degrees(2 * np.arcsin(np.minimum(chords / 2, 1.0)))
+
+
+def _closest_index(points_xyz: np.ndarray, target_xyz: np.ndarray) -> int:
+    """ Returns index of the unit sphere point closest to the target (largest dot product). """
+    return int((points_xyz @ target_xyz).argmax())
+
+
+# Spatial index used for nearest infrastructure point lookups.
+_POINTS_KEYS = tuple(INFRASTRUCTURE_POINTS)
+_POINTS_TREE = cKDTree(_to_unit_xyz(_POINTS_KEYS))
+
+# Endpoints of all submarine cables in one array, stored cable after cable.
+_ENDPOINT_CABLES = [cable for cable in SUBMARINE_CABLES if cable["endpoints"]]
+_CABLE_ENDPOINT_COUNTS = np.asarray([len(cable["endpoints"]) for cable in _ENDPOINT_CABLES])
+_CABLE_ENDPOINT_OFFSETS = np.concatenate(([0], np.cumsum(_CABLE_ENDPOINT_COUNTS)[:-1]))
+_ENDPOINT_CABLE_INDEXES = np.repeat(np.arange(len(_ENDPOINT_CABLES)), _CABLE_ENDPOINT_COUNTS)
+_CABLE_ENDPOINTS_XYZ = _to_unit_xyz([endpoint for cable in _ENDPOINT_CABLES for endpoint in cable["endpoints"]])
+
+
+@functools.lru_cache(maxsize=4096)
+def _closest_infrastructure_point(target_loc: tuple[float, float]) -> tuple[float, float]:
+    """ Returns infrastructure point closest to the target location. Results are memoized as paths revisit locations. """
+    _, closest_index = _POINTS_TREE.query(_to_unit_xyz(target_loc), k=1)
+    return _POINTS_KEYS[closest_index]
+
+
+def _closest_infrastructure_points(target_locs: list[tuple[float, float]]) -> list[tuple[float, float]]:
+    """ Returns infrastructure points closest to each of the target locations, queried as one batch. """
+    if not target_locs:
+        return []
+
+    _, closest_indexes = _POINTS_TREE.query(_to_unit_xyz(target_locs), k=1)
+    return [_POINTS_KEYS[closest_index] for closest_index in closest_indexes]
+
+
+def _cable_path_dists(endpoint_indexes: np.ndarray, entry_distances: np.ndarray, end_loc: tuple[float, float]) -> np.ndarray:
+    """ Returns path distances to the end location through the given cable endpoints. """
+    endpoint_entry_distances = entry_distances[_ENDPOINT_CABLE_INDEXES[endpoint_indexes]]
+    endpoint_distances = _great_circle_dists(_CABLE_ENDPOINTS_XYZ[endpoint_indexes], end_loc)
+    return endpoint_entry_distances + endpoint_distances + 0.5 * np.abs(endpoint_entry_distances - endpoint_distances)
+
+
+@functools.lru_cache(maxsize=4096)
+def _closest_submarine_cable_between(start_loc: tuple[float, float], end_loc: tuple[float, float]) -> tuple[float, dict]:
+    """
+    Returns (path distance, cable) for submarine cable with the shortest path from start to end location.
+    Entry distance is the cable's closest endpoint to the start.
+    """
+    entry_distances = np.minimum.reduceat(_great_circle_dists(_CABLE_ENDPOINTS_XYZ, start_loc), _CABLE_ENDPOINT_OFFSETS)
+
+    # A path through a cable is never shorter than its entry distance, so the best path through
+    # the nearest cable rules out every cable entered further away than that.
+    nearest_cable = int(entry_distances.argmin())
+    nearest_cable_start = _CABLE_ENDPOINT_OFFSETS[nearest_cable]
+    nearest_cable_endpoints = np.arange(nearest_cable_start, nearest_cable_start + _CABLE_ENDPOINT_COUNTS[nearest_cable])
+    distance_bound = _cable_path_dists(nearest_cable_endpoints, entry_distances, end_loc).min()
+
+    candidate_endpoints = np.flatnonzero(entry_distances[_ENDPOINT_CABLE_INDEXES] <= distance_bound)
+    total_distances = _cable_path_dists(candidate_endpoints, entry_distances, end_loc)
+    closest_index = int(total_distances.argmin())
+
+    return (float(total_distances[closest_index]), _ENDPOINT_CABLES[_ENDPOINT_CABLE_INDEXES[candidate_endpoints[closest_index]]])
+
+
+def _write_map_html(output_file: str, map_html: bytes) -> None:
+    """ Write rendered map into file path or file object (same outputs as folium's save). """
+    if isinstance(output_file, str):
+        with open(output_file, "wb") as f:
+            f.write(map_html)
+    else:
+        output_file.write(map_html)
+
+
+def _map_cache_key(snapped_points: list[tuple[float, float]], names: list[str]) -> str:
+    """ Maps are keyed by the snapped path and names, along with versions of the code and source data that built them. """
+    return hashlib.blake2b(repr((_MAP_CACHE_VERSIONS, snapped_points, names)).encode()).hexdigest()
+
+
+def _save_cached_map(cache_path: str, map_html: bytes) -> None:
+    """ Store rendered map in the map cache and trim it. """
+    if _atomic_write(cache_path, map_html, suffix=".tmp"):
+        _trim_map_cache()
+
+
+def _trim_map_cache() -> None:
+    """
+    Remove least recently used maps once the map cache grows over MAP_CACHE_MAX_SIZE.
+    Files removed concurrently by other builds are skipped, as are their in-progress temporary files.
+    """
+    cached_maps = []
+    for entry in os.scandir(MAP_CACHE_DIR):
+        if entry.name.endswith(".tmp"):
+            continue
+        try:
+            if entry.is_file():
+                cached_maps.append((entry.path, entry.stat()))
+        except FileNotFoundError:
             continue
 
-        for cable_endpoint in cable["endpoints"]:
-            INFRASTRUCTURE_POINTS[tuple(cable_endpoint)] = {
-                "type": SUBMARINE_TYPE,
-                "data": cable
-            }
+    cache_size = sum(stat.st_size for _, stat in cached_maps)
+
+    for path, stat in sorted(cached_maps, key=lambda cached_map: cached_map[1].st_mtime):
+        if cache_size <= MAP_CACHE_MAX_SIZE:
+            break
+
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        cache_size -= stat.st_size
 
 
 class PathBuilder:
     def __init__(self, path_points: list[tuple[tuple[float, float], str]], output_file: str) -> None:
         build_start_time = time.time_ns()
-        self.map = folium.Map()
+
+        # Snap all signal points to the infrastructure with a single query.
+        self._snapped = _closest_infrastructure_points([loc for loc, _ in path_points])
+
+        # Routes to popular targets snap to the same points, reuse map rendered for them before.
+        cache_path = os.path.join(MAP_CACHE_DIR, f"{_map_cache_key(self._snapped, [name for _, name in path_points])}.html")
+        try:
+            with open(cache_path, "rb") as cache_file:
+                cached_html = cache_file.read()
+        except FileNotFoundError:
+            cached_html = None
+
+        if cached_html is not None:
+            _write_map_html(output_file, cached_html)
+            try:
+                os.utime(cache_path)  # Mark as recently used.
+            except FileNotFoundError:
+                pass
+            print(f"Using cached map: {cache_path} ({output_file})")
+            return
+
+        self.map = folium.Map(prefer_canvas=True)  # Single canvas renders many lines faster than SVG elements.
+        self._drawn: set[frozenset] = set()
+        self._queued_paths: list[tuple[tuple[float, float], tuple[float, float]]] = []
+        self._ground_lines: list[list[tuple[float, float]]] = []
+        self._submarine_lines: dict[str, list[list[list[float, float]]]] = {}
 
         # Add markers to the signal points.
-        for index, (loc, name) in enumerate(path_points, 1):
-            folium.Marker(self.find_closest_point(loc, INFRASTRUCTURE_POINTS), f"({index}) {name}").add_to(self.map)
+        for index, (snapped_loc, (_, name)) in enumerate(zip(self._snapped, path_points), 1):
+            folium.Marker(snapped_loc, f"({index}) {name}").add_to(self.map)
 
         # Connect subsequent points.
-        for i in range(len(path_points)-1):
-            start = self.find_closest_point(path_points[i][0], INFRASTRUCTURE_POINTS)
-            end = self.find_closest_point(path_points[i+1][0], INFRASTRUCTURE_POINTS)
+        for start, end in zip(self._snapped, self._snapped[1:]):
             self.build_path_between(start, end)
 
-        self.map.save(output_file, close_file=False)
+        self.build_queued_paths()
+        self.add_lines_to_map()
+        map_html = self.map.get_root().render().encode("utf8")
+        _write_map_html(output_file, map_html)
         print(f"Built map in: {(time.time_ns() - build_start_time) / 1_000_000_000}s ({output_file})")
 
+        _save_cached_map(cache_path, map_html)
+
     def load_submarine_entries(self) -> dict[tuple[float, float], list[dict]]:
         """
         Parse submarine cables stored in points register.
@@ -64,8 +320,6 @@ class PathBuilder:
                 continue
 
             for endpoint in point_data["endpoints"]:
-                endpoint = tuple(endpoint)
-
                 if endpoint not in submarine_entries:
                     submarine_entries[endpoint] = []
                 submarine_entries[endpoint].append(point_data)
@@ -76,54 +330,57 @@ class PathBuilder:
         """ Returns point closest to the target location from list of points. """
         if not positions:
             return target_loc
-        
-        closest_dist = None
+
+        if positions is INFRASTRUCTURE_POINTS:
+            return _closest_infrastructure_point(target_loc)
+
+        # Compare the haversine term directly, it grows with the distance so asin and sqrt can be skipped.
+        target_lat, target_lon = math.radians(target_loc[0]), math.radians(target_loc[1])
+        target_lat_cos = math.cos(target_lat)
+        closest_h = None
         closest_point = None
 
         for pos in positions:
-            distance = math.dist(pos, target_loc)
-            if closest_dist is None or distance < closest_dist:
-                closest_dist = distance
+            lat, lon = math.radians(pos[0]), math.radians(pos[1])
+            h = math.sin((lat - target_lat) / 2) ** 2 + target_lat_cos * math.cos(lat) * math.sin((lon - target_lon) / 2) ** 2
+            if closest_h is None or h < closest_h:
+                closest_h = h
                 closest_point = pos
 
         return tuple(closest_point)
 
-    def find_closest_submarine_cable_between(self, start_loc: tuple[float, float], end_loc: tuple[float, float]) -> tuple[tuple[float, float], dict]:
-        cables_distance_to_entry = []
-
-        for cable in SUBMARINE_CABLES:
-            closest_entry = self.find_closest_point(start_loc, cable["endpoints"])
-            distance_to_entry = math.dist(start_loc, closest_entry)
-            cables_distance_to_entry.append((distance_to_entry, cable))
-        
-        min_path_distance = None
-        closest_cable = None
-
-        for (entry_distance, cable) in cables_distance_to_entry:
-            for endpoint_loc in cable["endpoints"]:
-                endpoint_distance = math.dist(endpoint_loc, end_loc)
-                total_distance = entry_distance + endpoint_distance + (0.5 * math.dist((entry_distance,), (endpoint_distance,)))
-        
-                if min_path_distance is None or total_distance < min_path_distance:
-                    min_path_distance = total_distance
-                    closest_cable = cable
-                
-        return (min_path_distance, closest_cable)
+    def find_closest_submarine_cable_between(self, start_loc: tuple[float, float], end_loc: tuple[float, float]) -> tuple[float, dict]:
+        return _closest_submarine_cable_between(start_loc, end_loc)
 
     def draw_ground_line(self, start_loc: tuple[float, float], end_loc: tuple[float, float], _no_break: bool = False) -> None:
-        if math.dist(start_loc, end_loc) > CABLE_BREAK_LEN and not _no_break:
+        if _great_circle_dist(start_loc, end_loc) > CABLE_BREAK_LEN and not _no_break:
             return self.break_path(start_loc, end_loc)
 
-        folium.PolyLine([start_loc, end_loc], color="red").add_to(self.map)
+        self._ground_lines.append([start_loc, end_loc])
+
+    def draw_submarine_cable(self, start_loc: tuple[float, float], end_loc: tuple[float, float], cable: dict) -> None:
+        geometry_xyz = cable.get("_geometry_xyz")
+        if geometry_xyz is None:  # Convert once, the same cable is drawn by many paths.
+            geometry_xyz = cable["_geometry_xyz"] = _to_unit_xyz(cable["geometry"])
 
-    def draw_submarine_cable(self, start_loc: tuple[float, float], end_loc: tuple[float, float], full_geometry: list[list[float, float]], name: str) -> None:
-        geometry_start = full_geometry.index(list(self.find_closest_point(start_loc, full_geometry)))
-        geometry_end = full_geometry.index(list(self.find_closest_point(end_loc, full_geometry)))
+        geometry_start = _closest_index(geometry_xyz, _to_unit_xyz(start_loc))
+        geometry_end = _closest_index(geometry_xyz, _to_unit_xyz(end_loc))
         if geometry_start > geometry_end:
             geometry_start, geometry_end = geometry_end, geometry_start
 
-        geometry_slice = full_geometry[geometry_start:geometry_end + 1]
-        folium.PolyLine(geometry_slice, name, color="blue", weight=3).add_to(self.map)
+        geometry_slice = cable["geometry"][geometry_start:geometry_end + 1]
+        self._submarine_lines.setdefault(cable["name"], []).append(geometry_slice)
+
+    def add_lines_to_map(self) -> None:
+        """
+        Add collected lines to the map as one PolyLine for all ground lines and one per submarine cable.
+        Rendering a few multi-lines is much cheaper than a separate map object for every segment.
+        """
+        if self._ground_lines:
+            folium.PolyLine(self._ground_lines, color="red").add_to(self.map)
+
+        for name, cable_lines in self._submarine_lines.items():
+            folium.PolyLine(cable_lines, name, color="blue", weight=3).add_to(self.map)
 
     def break_path(self, start_loc: tuple[float, float], end_loc: tuple[float, float]) -> None:
         """ 
@@ -131,10 +388,7 @@ class PathBuilder:
         and connecting START->MID, MID->END (theese connections might also be broken into shorter ones).
         This approach provides higher path accuracy as it will include more shorter submarine routes.
         """
-        mid_point = self.find_closest_point((
-            (start_loc[0]+end_loc[0])/2,
-            (start_loc[1]+end_loc[1])/2
-        ), INFRASTRUCTURE_POINTS)
+        mid_point = self.find_closest_point(_great_circle_midpoint(start_loc, end_loc), INFRASTRUCTURE_POINTS)
 
         if mid_point in {start_loc, end_loc}:  # There is no available point between start and end.
             return self.draw_ground_line(start_loc, end_loc, _no_break=True)  
@@ -142,7 +396,32 @@ class PathBuilder:
         self.build_path_between(start_loc, mid_point)
         self.build_path_between(mid_point, end_loc)
 
-    def build_path_between(self, start_loc: tuple[float, float], end_loc: tuple[float, float]) -> list[dict]:
+    def build_path_between(self, start_loc: tuple[float, float], end_loc: tuple[float, float]) -> None:
+        """ Queue path between two infrastructure points, it is built by `build_queued_paths`. """
+        self._queued_paths.append((start_loc, end_loc))
+
+    def build_queued_paths(self) -> None:
+        """
+        Build queued paths with an explicit stack instead of recursion, as path breaking can nest deeply.
+        Paths queued while building another one are built next, in the order they were queued,
+        which matches the order of the former recursive calls.
+        """
+        paths_stack = []
+
+        while True:
+            paths_stack.extend(reversed(self._queued_paths))
+            self._queued_paths.clear()
+            if not paths_stack:
+                return
+
+            self._build_path(*paths_stack.pop())
+
+    def _build_path(self, start_loc: tuple[float, float], end_loc: tuple[float, float]) -> None:
+        edge = frozenset((start_loc, end_loc))
+        if edge in self._drawn:  # Path breaking often arrives at already drawn edges.
+            return
+        self._drawn.add(edge)
+
         start_data = INFRASTRUCTURE_POINTS[start_loc]["data"]
         start_type = INFRASTRUCTURE_POINTS[start_loc]["type"]
         end_data = INFRASTRUCTURE_POINTS[end_loc]["data"]
@@ -161,7 +440,7 @@ class PathBuilder:
             self._submarine_to_ground(start_loc, start_data, end_loc)
 
     def _ground_to_ground(self, start_loc: tuple[float, float], end_loc: tuple[float, float]) -> None:
-        ground_distance = math.dist(start_loc, end_loc)
+        ground_distance = _great_circle_dist(start_loc, end_loc)
         water_distance, closest_cable = self.find_closest_submarine_cable_between(start_loc, end_loc)
 
         if water_distance < ground_distance:
@@ -169,7 +448,7 @@ class PathBuilder:
             closest_cable_exit = self.find_closest_point(end_loc, closest_cable["endpoints"])
 
             self.draw_ground_line(start_loc, closest_cable_entry)
-            self.draw_submarine_cable(closest_cable_entry, closest_cable_exit, closest_cable["geometry"], closest_cable["name"])
+            self.draw_submarine_cable(closest_cable_entry, closest_cable_exit, closest_cable)
             return self.build_path_between(closest_cable_exit, end_loc)
 
         return self.draw_ground_line(start_loc, end_loc)
@@ -177,7 +456,7 @@ class PathBuilder:
     def _submarine_to_ground(self, start_loc: tuple[float, float], start_data: dict, end_loc: tuple[float, float]) -> None:
         closest_cable_exit = self.find_closest_point(end_loc, start_data["endpoints"])
         if closest_cable_exit != start_loc:  # Submarine cable can transfer packet closer to the target.
-            self.draw_submarine_cable(start_loc, closest_cable_exit, start_data["geometry"], start_data["name"])
+            self.draw_submarine_cable(start_loc, closest_cable_exit, start_data)
             return self.build_path_between(closest_cable_exit, end_loc)
 
         self.draw_ground_line(start_loc, end_loc)
@@ -188,12 +467,12 @@ class PathBuilder:
             return self.draw_ground_line(start_loc, end_loc)
 
         self.build_path_between(start_loc, closest_cable_entry)
-        self.draw_submarine_cable(closest_cable_entry, end_loc, end_data["geometry"], end_data["name"])
+        self.draw_submarine_cable(closest_cable_entry, end_loc, end_data)
 
     def _submarine_to_submarine(self, start_loc: tuple[float, float], start_data: dict, end_loc: tuple[float, float], end_data: dict) -> None:
         # The same cable.
-        if end_loc in start_data["endpoints"]:
-            return self.draw_submarine_cable(start_loc, end_loc, start_data["geometry"], start_data["name"])
+        if end_loc in start_data["_endpoints_set"]:
+            return self.draw_submarine_cable(start_loc, end_loc, start_data)
 
         # Different cable.
         closest_endpoint = self.find_closest_point(end_loc, start_data["endpoints"])
@@ -202,8 +481,8 @@ class PathBuilder:
             self.draw_ground_line(start_loc, closest_entry)
 
             if closest_entry != end_loc:
-                self.draw_submarine_cable(closest_entry, end_loc, end_data["geometry"], end_data["name"])
+                self.draw_submarine_cable(closest_entry, end_loc, end_data)
 
         else:
-            self.draw_submarine_cable(start_loc, closest_endpoint, start_data["geometry"], start_data["name"])
+            self.draw_submarine_cable(start_loc, closest_endpoint, start_data)
             return self.build_path_between(closest_endpoint, end_loc)
@@ -1,30 +1,103 @@
-import random
+import numpy as np
+import pytest
+import pickle
 import map
 import io
 
 LAT_LIMIT = 90
 LON_LIMIT = 180
 
+_rng = np.random.default_rng()
+
+
+@pytest.fixture(autouse=True)
+def _map_cache_dir(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(map, "MAP_CACHE_DIR", str(tmp_path))
+
+
 def _generate_path_points(n_points: int) -> list[tuple[tuple[float, float], str]]:
-    return [
-        (
-            (
-                random.uniform(-LAT_LIMIT, LAT_LIMIT),
-                random.uniform(-LON_LIMIT, LON_LIMIT)
-            ),
-            f"test-{random.randint(1000, 9999)}"
-        )
-        for _ in range(n_points)
-    ]
+    lats = _rng.uniform(-LAT_LIMIT, LAT_LIMIT, n_points).tolist()
+    lons = _rng.uniform(-LON_LIMIT, LON_LIMIT, n_points).tolist()
+    ids = _rng.integers(1000, 10000, n_points).tolist()
+
+    return [((lat, lon), f"test-{point_id}") for lat, lon, point_id in zip(lats, lons, ids)]
 
 
 PATH_SIZES = range(3, 7)
+PATH_REPEATS = 3
 
 
-def test_pathbuilder() -> None:
+@pytest.mark.parametrize("attempt", range(PATH_REPEATS))
+@pytest.mark.parametrize("path_size", PATH_SIZES)
+def test_pathbuilder(path_size: int, attempt: int) -> None:
     assert map.INFRASTRUCTURE_POINTS, "Missing data"
 
-    for path_size in PATH_SIZES:
-        for _ in range(3):
-            test_path = _generate_path_points(path_size)
-            map.PathBuilder(test_path, io.BytesIO())
+    test_path = _generate_path_points(path_size)
+    map.PathBuilder(test_path, io.BytesIO())
+
+
+def test_pathbuilder_cached_map(tmp_path) -> None:
+    test_path = _generate_path_points(4)
+
+    built_html = io.BytesIO()
+    map.PathBuilder(test_path, built_html)
+    cached_html = io.BytesIO()
+    map.PathBuilder(test_path, cached_html)
+
+    assert cached_html.getvalue() == built_html.getvalue()
+    assert [path.suffix for path in tmp_path.iterdir()] == [".html"]
+
+
+_TRUNCATED_CACHE = pickle.dumps((map.INFRASTRUCTURE_CACHE_VERSION, {(1.0, 2.0): {"type": map.GROUND_EXCHANGE_TYPE, "data": "test"}}, []))[:-8]
+
+
+@pytest.mark.parametrize("cached_data", [
+    b"",
+    b"not a pickle",
+    _TRUNCATED_CACHE,
+    pickle.dumps((map.INFRASTRUCTURE_CACHE_VERSION - 1, {}, [])),
+], ids=["empty", "corrupt", "truncated", "old-version"])
+def test_infrastructure_cache_fallback(cached_data: bytes, tmp_path, monkeypatch) -> None:
+    cache_path = tmp_path / "_cache.pkl"
+    cache_path.write_bytes(cached_data)
+    monkeypatch.setattr(map, "INFRASTRUCTURE_CACHE_PATH", str(cache_path))
+
+    infrastructure_points, submarine_cables = map._load_infrastructure()
+
+    assert infrastructure_points.keys() == map.INFRASTRUCTURE_POINTS.keys()
+    assert len(submarine_cables) == len(map.SUBMARINE_CABLES)
+    assert map._load_infrastructure_cache() is not None, "Invalid cache was not replaced"
+
+
+def test_pathbuilder_same_cable() -> None:
+    cable = next(
+        cable for cable in map.SUBMARINE_CABLES
+        if len(cable["endpoints"]) > 1 and all(map.INFRASTRUCTURE_POINTS[endpoint]["data"] is cable for endpoint in cable["endpoints"])
+    )
+    start_loc, end_loc = cable["endpoints"][0], cable["endpoints"][-1]
+
+    path_builder = map.PathBuilder([(start_loc, "start"), (end_loc, "end")], io.BytesIO())
+
+    assert path_builder._ground_lines == [], "Endpoints of the same cable were connected by ground"
+    assert list(path_builder._submarine_lines) == [cable["name"]]
+    assert len(path_builder._submarine_lines[cable["name"]]) == 1
+
+
+def _cable_path_distance(cable: dict, start_loc: tuple[float, float], end_loc: tuple[float, float]) -> float:
+    """ Shortest path distance through the cable, scored over all of its endpoints. """
+    entry_distance = min(map._great_circle_dist(start_loc, endpoint) for endpoint in cable["endpoints"])
+    exit_distances = [map._great_circle_dist(endpoint, end_loc) for endpoint in cable["endpoints"]]
+    return min(entry_distance + exit_distance + 0.5 * abs(entry_distance - exit_distance) for exit_distance in exit_distances)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_closest_submarine_cable_between(seed: int) -> None:
+    start_index, end_index = np.random.default_rng(seed).choice(len(map._POINTS_KEYS), 2, replace=False)
+    start_loc, end_loc = map._POINTS_KEYS[start_index], map._POINTS_KEYS[end_index]
+
+    distance, cable = map._closest_submarine_cable_between(start_loc, end_loc)
+    # Brute force over every cable, pruning must never skip the shortest path.
+    expected_distance = min(_cable_path_distance(cable, start_loc, end_loc) for cable in map.SUBMARINE_CABLES if cable["endpoints"])
+
+    assert distance == pytest.approx(expected_distance)
+    assert _cable_path_distance(cable, start_loc, end_loc) == pytest.approx(expected_distance)
@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from tracing import traceapi
+import requests
+import hashlib
+import pytest
+
+
+def _build_response(coords: str, markers: str) -> bytes:
+    return (
+        '<html><script>\n'
+        f'var traceData = {{"traceCoordinates": [{coords}], "traceMarkers": [{markers}]}};\n'
+        '</script></html>'
+    ).encode()
+
+
+def _coord(lat: str, lng: str) -> str:
+    return f'{{"lat": {lat}, "lng": {lng}}}'
+
+
+def _marker(hop: int, hostname: str) -> str:
+    return f'{{"hop": {hop}, "hostname": {hostname}, "ip": "10.0.0.{hop}"}}'
+
+
+def test_parse_response() -> None:
+    response = _build_response(
+        ", ".join((_coord("37.751", "-97.822"), _coord("-33.8688", "151.2093"), _coord("1e1", "-0.5"))),
+        ", ".join((_marker(1, '"router1.example.net"'), _marker(2, '"syd.example.com"'), _marker(3, '"last.example"'))),
+    )
+
+    assert traceapi.parse_response(response) == [
+        ((37.751, -97.822), "router1.example.net"),
+        ((-33.8688, 151.2093), "syd.example.com"),
+        ((10.0, -0.5), "last.example"),
+    ]
+
+
+def test_parse_response_null_hostname() -> None:
+    response = _build_response(
+        ", ".join((_coord("1.5", "2.5"), _coord("3.5", "4.5"))),
+        ", ".join((_marker(1, "null"), _marker(2, '"hop2.example"'))),
+    )
+
+    assert traceapi.parse_response(response) == [((1.5, 2.5), ""), ((3.5, 4.5), "hop2.example")]
+
+
+def test_parse_response_null_coordinates() -> None:
+    response = _build_response(
+        ", ".join((_coord("1.5", "2.5"), _coord("null", "null"), _coord("3.5", "4.5"))),
+        ", ".join((_marker(1, '"hop1.example"'), _marker(2, '"hop2.example"'), _marker(3, '"hop3.example"'))),
+    )
+
+    assert traceapi.parse_response(response) == [((1.5, 2.5), "hop1.example"), ((3.5, 4.5), "hop3.example")]
+
+
+_TWO_MARKERS = ", ".join((_marker(1, '"hop1.example"'), _marker(2, '"hop2.example"')))
+
+
+@pytest.mark.parametrize("response", [
+    b"<h3>Traceroute Error</h3>",
+    b"",
+    _build_response(_coord("1.5", "2.5"), _marker(1, '"hop1.example"'))[:-40],
+    # Entries the patterns cannot match come first, so a mismatch would shift hostnames onto other hops.
+    _build_response(", ".join(('{"lng": 2.5, "lat": 1.5}', _coord("3.5", "4.5"))), _TWO_MARKERS),
+    _build_response(", ".join(('{"lat": "1.5", "lng": "2.5"}', _coord("3.5", "4.5"))), _TWO_MARKERS),
+    _build_response(", ".join(('{"lat": 1.5, "alt": 0, "lng": 2.5}', _coord("3.5", "4.5"))), _TWO_MARKERS),
+    _build_response(", ".join((_coord("1.5", "2.5"), _coord("3.5", "4.5"))), ", ".join((_marker(1, "42"), _marker(2, '"hop2.example"')))),
+])
+def test_parse_response_malformed(response: bytes) -> None:
+    assert traceapi.parse_response(response) == []
+
+
+_VALID_RESPONSE = _build_response(_coord("1.5", "2.5"), _marker(1, '"hop1.example"'))
+
+
+class _FakeResponse:
+    def __init__(self, body: bytes, status_code: int = 200, fail_after: int | None = None) -> None:
+        self.body = body
+        self.status_code = status_code
+        self.fail_after = fail_after
+
+    def __enter__(self) -> "_FakeResponse":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+    def iter_content(self, chunk_size: int):
+        for offset in range(0, len(self.body), chunk_size):
+            if self.fail_after is not None and offset >= self.fail_after:
+                raise requests.ConnectionError("Connection lost")
+            yield self.body[offset:offset + chunk_size]
+
+
+class _FakeSession:
+    def __init__(self, response: _FakeResponse | Exception) -> None:
+        self.response = response
+        self.posts = 0
+
+    def post(self, *args, **kwargs) -> _FakeResponse:
+        self.posts += 1
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+@pytest.fixture(autouse=True)
+def _cache_dir(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(traceapi, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(traceapi, "DOWNLOAD_CHUNK_SIZE", 16)
+    monkeypatch.setattr(traceapi, "_memory_cache", OrderedDict())
+    monkeypatch.setattr(traceapi, "_memory_cache_size", 0)
+
+
+def test_get_route_data_cached(tmp_path, monkeypatch) -> None:
+    session = _FakeSession(_FakeResponse(_VALID_RESPONSE))
+    monkeypatch.setattr(traceapi, "_SESSION", session)
+
+    assert traceapi.get_route_data("example.com") == _VALID_RESPONSE
+    cache_name = hashlib.blake2b(b"example.com", digest_size=16).hexdigest()
+    assert [path.name for path in tmp_path.iterdir()] == [cache_name]
+    assert (tmp_path / cache_name).read_bytes() == _VALID_RESPONSE
+
+    assert traceapi.get_route_data("example.com") == _VALID_RESPONSE
+    assert session.posts == 1, "Cached response was requested again"
+
+
+def test_get_route_data_error_page(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(traceapi, "_SESSION", _FakeSession(_FakeResponse(b"<h3>Traceroute Error</h3>")))
+
+    assert traceapi.get_route_data("example.com") is None
+    assert list(tmp_path.iterdir()) == [], "Error page was cached"
+
+
+@pytest.mark.parametrize("response", [
+    requests.ConnectionError("Connection refused"),
+    _FakeResponse(b"<html>Too many requests</html>", status_code=429),
+    _FakeResponse(_VALID_RESPONSE, fail_after=32),
+], ids=["request-failed", "http-error", "connection-lost"])
+def test_get_route_data_failed(response: _FakeResponse | Exception, tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(traceapi, "_SESSION", _FakeSession(response))
+
+    with pytest.raises(requests.RequestException):
+        traceapi.get_route_data("example.com")
+    assert list(tmp_path.iterdir()) == [], "Failed request left a file in the cache"
@@ -1,74 +1,155 @@
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from collections import OrderedDict
+import threading
 import requests
-import json
+import tempfile
+import hashlib
 import os
+import re
 
 
 CACHE_DIR = "./cache/"
-if not os.path.exists(CACHE_DIR):
-    os.mkdir(CACHE_DIR)
-    print("Created ./cache/ directory")
+os.makedirs(CACHE_DIR, exist_ok=True)
 
+# Missing hostname (null) is matched as an empty one to keep hostnames aligned with coordinates.
+_HOSTNAME_RE = re.compile(rb'"hostname":\s*(?:"([^"]*)"|null)')
+# Coordinates have a fixed {"lat": ..., "lng": ...} shape, null ones are matched to keep them aligned with hostnames.
+_COORD_RE = re.compile(
+    rb'"lat":\s*(null|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?),\s*'
+    rb'"lng":\s*(null|-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)'
+)
+_COORDS_START = b'"traceCoordinates": '
+_COORDS_END = b', "traceMarkers"'
+_MARKERS_START = b'"traceMarkers": '
+_MARKERS_END = b";\n"
 
-def get_route_data(target_addr: str) -> str | None:
-    cache_address = CACHE_DIR + target_addr.replace(".", "_")
-    if os.path.exists(cache_address):
+FETCH_WORKERS = 16
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+MEMORY_CACHE_MAX_SIZE = 32 * 1024 * 1024  # Bytes, responses are 50-500 KB each.
+
+# Recently read cached responses by cache path, least recently used first.
+_memory_cache: OrderedDict[str, bytes] = OrderedDict()
+_memory_cache_size = 0
+_memory_cache_lock = threading.Lock()
+
+# Shared session reuses TCP/TLS connections between requests.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_maxsize=FETCH_WORKERS))
+
+TRACE_API_URL = "https://traceroute-online.com/trace"
+_REQUEST_HEADERS = {
+    "accept": "*/*",
+    "content-type": "multipart/form-data; boundary=----WebKitFormBoundaryPZvxAgX56AGMrdA3",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36"
+}
+
+# Multipart form body is constant except for the target address placed between these parts.
+_REQUEST_BODY_HEAD = (
+    b"------WebKitFormBoundaryPZvxAgX56AGMrdA3\r\n"
+    b"Content-Disposition: form-data; name=\"target\"\r\n\r\n"
+)
+_REQUEST_BODY_TAIL = (
+    b"\r\n"
+    b"------WebKitFormBoundaryPZvxAgX56AGMrdA3\r\n"
+    b"Content-Disposition: form-data; name=\"query_type\"\r\n\r\n"
+    b"trace\r\n"
+    b"------WebKitFormBoundaryPZvxAgX56AGMrdA3--\r\n"
+)
+
+
+def _read_cached_route_data(cache_address: str) -> bytes:
+    """
+    Memoized read of a cached response, least recently used ones are dropped over MEMORY_CACHE_MAX_SIZE.
+    Missing file raises FileNotFoundError, which is not memoized.
+    """
+    global _memory_cache_size
+
+    with _memory_cache_lock:
+        route_data = _memory_cache.get(cache_address)
+        if route_data is not None:
+            _memory_cache.move_to_end(cache_address)
+            return route_data
+
+    with open(cache_address, "rb") as f:
+        route_data = f.read()
+
+    with _memory_cache_lock:
+        if cache_address not in _memory_cache:
+            _memory_cache[cache_address] = route_data
+            _memory_cache_size += len(route_data)
+
+        while _memory_cache_size > MEMORY_CACHE_MAX_SIZE:
+            _, evicted_data = _memory_cache.popitem(last=False)
+            _memory_cache_size -= len(evicted_data)
+
+    return route_data
+
+
+def get_route_data(target_addr: str) -> bytes | None:
+    # Hashed name is path safe and cannot collide like addresses with replaced dots could.
+    cache_address = os.path.join(CACHE_DIR, hashlib.blake2b(target_addr.encode(), digest_size=16).hexdigest())
+    try:
+        route_data = _read_cached_route_data(cache_address)
         print(f"Using cached response for: {target_addr}")
-        with open(cache_address) as f:
-            return f.read()
-        
-    url = "https://traceroute-online.com/trace"
-    
-    headers = {
-        "accept": "*/*",
-        "content-type": "multipart/form-data; boundary=----WebKitFormBoundaryPZvxAgX56AGMrdA3",
-        "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36"
-    }
-    
-    data = b"------WebKitFormBoundaryPZvxAgX56AGMrdA3\r\n"
-    data += b"Content-Disposition: form-data; name=\"target\"\r\n\r\n"
-    data += target_addr.encode() + b"\r\n"
-    data += b"------WebKitFormBoundaryPZvxAgX56AGMrdA3\r\n"
-    data += b"Content-Disposition: form-data; name=\"query_type\"\r\n\r\n"
-    data += b"trace\r\n"
-    data += b"------WebKitFormBoundaryPZvxAgX56AGMrdA3--\r\n"
-    
-    response = requests.post(url, headers=headers, data=data)
-    
-    if "<h3>Traceroute Error</h3>" in response.text:
+        return route_data
+    except FileNotFoundError:
+        pass
+
+    data = b"".join((_REQUEST_BODY_HEAD, target_addr.encode(), _REQUEST_BODY_TAIL))
+
+    # Stream the response to a temporary file in chunks, it is moved into the cache once known to be valid.
+    temp_fd, temp_address = tempfile.mkstemp(dir=CACHE_DIR)
+    try:
+        with open(temp_fd, "wb") as f, _SESSION.post(TRACE_API_URL, headers=_REQUEST_HEADERS, data=data, stream=True) as response:
+            response.raise_for_status()  # Rate limit and server error pages must not be cached.
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+
+        with open(temp_address, "rb") as f:
+            route_data = f.read()
+    except BaseException:  # Failed request or interrupted download must not leave a partial file behind.
+        os.remove(temp_address)
+        raise
+
+    # Error pages and other responses without trace data would be served from the cache forever.
+    if not parse_response(route_data):
+        os.remove(temp_address)
         print(f"Cannot get tracing data for: {target_addr}")
         return
-    
-    with open(cache_address, "w") as f:
-        f.write(response.text)
-        print(f"Cached response to: {target_addr}")
-    
-    return response.text
-    
 
-def fetch_hostnames(string: str, _hostnames: list[str] = None) -> list[str]:
-    hostname_init = '"hostname": '
-    if _hostnames is None:
-        _hostnames = []
-        
-    if hostname_init not in string:
-        return _hostnames
-    
-    chopped, hostname_part = string.split(hostname_init, 1)
-    hostname = hostname_part.split(",")[0][1:][:-1]
-    _hostnames.append(hostname)
-    
-    string = string[(len(chopped) + len(hostname_init) + len(hostname) + 3):]
-    return fetch_hostnames(string, _hostnames)
+    os.replace(temp_address, cache_address)
+    print(f"Cached response to: {target_addr}")
+    return route_data
 
 
-def parse_response(response: str) -> list[tuple[tuple[float, float], str]]:
-    locations = json.loads(response.split('"traceCoordinates": ')[1].split(', "traceMarkers"')[0])
-    hostnames = fetch_hostnames(response.split('"traceMarkers": ')[1].split(";\n")[0][:-1])
+def get_route_data_many(target_addrs: list[str]) -> dict[str, bytes | None]:
+    """ Fetch route data for multiple targets concurrently, requests are bound by network latency. """
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        return dict(zip(target_addrs, executor.map(get_route_data, target_addrs)))
     
-    points = []
-    for loc, hname in zip(locations, hostnames):
-        points.append((
-            (loc["lat"], loc["lng"]), hname
-        ))
 
-    return points
+def parse_response(response: bytes) -> list[tuple[tuple[float, float], str]]:
+    # Locate both sections by offsets and scan them in place, without copying them out of the response.
+    coords_start = response.find(_COORDS_START)
+    coords_end = response.find(_COORDS_END, coords_start)
+    markers_start = response.find(_MARKERS_START, coords_end)
+    markers_end = response.find(_MARKERS_END, markers_start)
+    if min(coords_start, coords_end, markers_start, markers_end) < 0:  # Error page or truncated response.
+        return []
+
+    coords_start += len(_COORDS_START)
+    markers_start += len(_MARKERS_START)
+    coord_matches = list(_COORD_RE.finditer(response, coords_start, coords_end))
+    hostname_matches = list(_HOSTNAME_RE.finditer(response, markers_start, markers_end - 1))
+
+    # Any entry the patterns do not match would shift hostnames onto other hops, so such a response is rejected.
+    if (len(coord_matches) != response.count(b"{", coords_start, coords_end)
+            or len(hostname_matches) != response.count(b'"hostname"', markers_start, markers_end - 1)):
+        return []
+
+    return [
+        ((float(loc[1]), float(loc[2])), (hname[1] or b"").decode())
+        for loc, hname in zip(coord_matches, hostname_matches)
+        if loc[1] != b"null" and loc[2] != b"null"
+    ]